@@ -6,35 +6,88 @@ d = { 'settings': { 'branch': 'main',
                 'git_url': 'https://github.com/numb3r33/rank-bert',
                 'lib_path': 'rank_bert'},
   'syms': { 'rank_bert.core': {'rank_bert.core.foo': ('core.html#foo', 'rank_bert/core.py')},
-            'rank_bert.data.load_data': { 'rank_bert.data.load_data.F1Score': ('data.html#f1score', 'rank_bert/data/load_data.py'),
-                                          'rank_bert.data.load_data.F1Score.__call__': ( 'data.html#f1score.__call__',
+            'rank_bert.data.load_data': { 'rank_bert.data.load_data.BucketedSortedDL': ( 'data.html#bucketedsorteddl',
                                                                                          'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.BucketedSortedDL.__init__': ( 'data.html#bucketedsorteddl.__init__',
+                                                                                                  'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.BucketedSortedDL.__len__': ( 'data.html#bucketedsorteddl.__len__',
+                                                                                                 'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.BucketedSortedDL._batchify': ( 'data.html#bucketedsorteddl._batchify',
+                                                                                                   'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.BucketedSortedDL.create_batches': ( 'data.html#bucketedsorteddl.create_batches',
+                                                                                                        'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.BucketedSortedDL.get_idxs': ( 'data.html#bucketedsorteddl.get_idxs',
+                                                                                                  'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.BucketedSortedDL.new': ( 'data.html#bucketedsorteddl.new',
+                                                                                             'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.BucketedSortedDL.sample': ( 'data.html#bucketedsorteddl.sample',
+                                                                                                'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.F1Score': ('data.html#f1score', 'rank_bert/data/load_data.py'),
                                           'rank_bert.data.load_data.F1Score.__init__': ( 'data.html#f1score.__init__',
                                                                                          'rank_bert/data/load_data.py'),
                                           'rank_bert.data.load_data.F1Score.__repr__': ( 'data.html#f1score.__repr__',
                                                                                          'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.F1Score.accumulate': ( 'data.html#f1score.accumulate',
+                                                                                           'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.F1Score.name': ( 'data.html#f1score.name',
+                                                                                     'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.F1Score.reset': ( 'data.html#f1score.reset',
+                                                                                      'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.F1Score.value': ( 'data.html#f1score.value',
+                                                                                      'rank_bert/data/load_data.py'),
                                           'rank_bert.data.load_data.GLUEDataManager': ( 'data.html#gluedatamanager',
                                                                                         'rank_bert/data/load_data.py'),
                                           'rank_bert.data.load_data.GLUEDataManager.__init__': ( 'data.html#gluedatamanager.__init__',
                                                                                                  'rank_bert/data/load_data.py'),
-                                          'rank_bert.data.load_data.GLUEDataManager._prepare_fastai_data': ( 'data.html#gluedatamanager._prepare_fastai_data',
-                                                                                                             'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._bucket_indices': ( 'data.html#gluedatamanager._bucket_indices',
+                                                                                                        'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._bucket_kwargs': ( 'data.html#gluedatamanager._bucket_kwargs',
+                                                                                                       'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._input_columns': ( 'data.html#gluedatamanager._input_columns',
+                                                                                                       'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._rows': ( 'data.html#gluedatamanager._rows',
+                                                                                              'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._set_prefetch': ( 'data.html#gluedatamanager._set_prefetch',
+                                                                                                      'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._subsample': ( 'data.html#gluedatamanager._subsample',
+                                                                                                   'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._tokenize': ( 'data.html#gluedatamanager._tokenize',
+                                                                                                  'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._tokenize_datasets': ( 'data.html#gluedatamanager._tokenize_datasets',
+                                                                                                           'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._tokenize_split': ( 'data.html#gluedatamanager._tokenize_split',
+                                                                                                        'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.GLUEDataManager._tokenized_cache_path': ( 'data.html#gluedatamanager._tokenized_cache_path',
+                                                                                                              'rank_bert/data/load_data.py'),
                                           'rank_bert.data.load_data.GLUEDataManager.create_dataloaders': ( 'data.html#gluedatamanager.create_dataloaders',
                                                                                                            'rank_bert/data/load_data.py'),
                                           'rank_bert.data.load_data.GLUEDataManager.create_test_dataloader': ( 'data.html#gluedatamanager.create_test_dataloader',
                                                                                                                'rank_bert/data/load_data.py'),
                                           'rank_bert.data.load_data.GLUEDataManager.load_datasets': ( 'data.html#gluedatamanager.load_datasets',
                                                                                                       'rank_bert/data/load_data.py'),
-                                          'rank_bert.data.load_data.TextGetter': ('data.html#textgetter', 'rank_bert/data/load_data.py'),
-                                          'rank_bert.data.load_data.TextGetter.__init__': ( 'data.html#textgetter.__init__',
-                                                                                            'rank_bert/data/load_data.py'),
-                                          'rank_bert.data.load_data.TextGetter.encodes': ( 'data.html#textgetter.encodes',
+                                          'rank_bert.data.load_data.RowGetter': ('data.html#rowgetter', 'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.RowGetter.__init__': ( 'data.html#rowgetter.__init__',
                                                                                            'rank_bert/data/load_data.py'),
+                                          'rank_bert.data.load_data.RowGetter.encodes': ( 'data.html#rowgetter.encodes',
+                                                                                          'rank_bert/data/load_data.py'),
                                           'rank_bert.data.load_data.accuracy': ('data.html#accuracy', 'rank_bert/data/load_data.py')},
+            'rank_bert.data.packing': { 'rank_bert.data.packing.PackedCategorize': ( 'data_packing.html#packedcategorize',
+                                                                                     'rank_bert/data/packing.py'),
+                                        'rank_bert.data.packing.PackedCategorize.encodes': ( 'data_packing.html#packedcategorize.encodes',
+                                                                                             'rank_bert/data/packing.py'),
+                                        'rank_bert.data.packing.PackedTokBatchTransform': ( 'data_packing.html#packedtokbatchtransform',
+                                                                                            'rank_bert/data/packing.py'),
+                                        'rank_bert.data.packing.PackedTokBatchTransform.encodes': ( 'data_packing.html#packedtokbatchtransform.encodes',
+                                                                                                    'rank_bert/data/packing.py'),
+                                        'rank_bert.data.packing.pack_examples': ( 'data_packing.html#pack_examples',
+                                                                                  'rank_bert/data/packing.py'),
+                                        'rank_bert.data.packing.pack_ffd': ('data_packing.html#pack_ffd', 'rank_bert/data/packing.py')},
             'rank_bert.data.transforms': { 'rank_bert.data.transforms.TokBatchTransform': ( 'data_transforms.html#tokbatchtransform',
                                                                                             'rank_bert/data/transforms.py'),
                                            'rank_bert.data.transforms.TokBatchTransform.__init__': ( 'data_transforms.html#tokbatchtransform.__init__',
                                                                                                      'rank_bert/data/transforms.py'),
+                                           'rank_bert.data.transforms.TokBatchTransform._tokenize_texts': ( 'data_transforms.html#tokbatchtransform._tokenize_texts',
+                                                                                                            'rank_bert/data/transforms.py'),
                                            'rank_bert.data.transforms.TokBatchTransform.decodes': ( 'data_transforms.html#tokbatchtransform.decodes',
                                                                                                     'rank_bert/data/transforms.py'),
                                            'rank_bert.data.transforms.TokBatchTransform.encodes': ( 'data_transforms.html#tokbatchtransform.encodes',
@@ -43,14 +96,26 @@ d = { 'settings': { 'branch': 'main',
                                                                                           'rank_bert/data/transforms.py'),
                                            'rank_bert.data.transforms.Undict': ( 'data_transforms.html#undict',
                                                                                  'rank_bert/data/transforms.py'),
+                                           'rank_bert.data.transforms.Undict._decode_packed': ( 'data_transforms.html#undict._decode_packed',
+                                                                                                'rank_bert/data/transforms.py'),
                                            'rank_bert.data.transforms.Undict.decodes': ( 'data_transforms.html#undict.decodes',
-                                                                                         'rank_bert/data/transforms.py')},
+                                                                                         'rank_bert/data/transforms.py'),
+                                           'rank_bert.data.transforms.split_by_sep': ( 'data_transforms.html#split_by_sep',
+                                                                                       'rank_bert/data/transforms.py')},
             'rank_bert.models.base_models': { 'rank_bert.models.base_models.BertWrapper': ( 'models.html#bertwrapper',
                                                                                             'rank_bert/models/base_models.py'),
                                               'rank_bert.models.base_models.BertWrapper.__init__': ( 'models.html#bertwrapper.__init__',
                                                                                                      'rank_bert/models/base_models.py'),
+                                              'rank_bert.models.base_models.BertWrapper._fwd_no_ttids': ( 'models.html#bertwrapper._fwd_no_ttids',
+                                                                                                          'rank_bert/models/base_models.py'),
+                                              'rank_bert.models.base_models.BertWrapper._fwd_with_ttids': ( 'models.html#bertwrapper._fwd_with_ttids',
+                                                                                                            'rank_bert/models/base_models.py'),
                                               'rank_bert.models.base_models.BertWrapper.forward': ( 'models.html#bertwrapper.forward',
                                                                                                     'rank_bert/models/base_models.py'),
+                                              'rank_bert.models.base_models.BertWrapper.forward_packed': ( 'models.html#bertwrapper.forward_packed',
+                                                                                                           'rank_bert/models/base_models.py'),
+                                              'rank_bert.models.base_models.BertWrapper.forward_unpacked': ( 'models.html#bertwrapper.forward_unpacked',
+                                                                                                             'rank_bert/models/base_models.py'),
                                               'rank_bert.models.base_models.count_parameters': ( 'models.html#count_parameters',
                                                                                                  'rank_bert/models/base_models.py'),
                                               'rank_bert.models.base_models.get_pretrained_model': ( 'models.html#get_pretrained_model',
@@ -0,0 +1,29 @@
+"""Compiled first-fit-decreasing packing used by `pack_examples` when `numba` is installed"""
+
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/01c_data_packing_numba.ipynb.
+
+# %% auto 0
+__all__ = ['pack_ffd']
+
+# %% ../../nbs/01c_data_packing_numba.ipynb 3
+import numpy as np
+from numba import njit
+
+# %% ../../nbs/01c_data_packing_numba.ipynb 5
+@njit(cache=True)
+def pack_ffd(lengths, max_len):
+    "First-fit-decreasing bin packing over an `int64` array of `lengths`, returns the `int64` bin index of every sample"
+    order = np.argsort(-lengths, kind='mergesort')
+    bin_ids = np.empty(len(lengths), dtype=np.int64)
+    space = np.empty(len(lengths), dtype=np.int64)
+    n_bins = 0
+    for i in order:
+        b = 0
+        while b < n_bins and space[b] < lengths[i]:
+            b += 1
+        if b == n_bins:
+            space[b] = max_len
+            n_bins += 1
+        space[b] -= lengths[i]
+        bin_ids[i] = b
+    return bin_ids
@@ -3,32 +3,62 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/01_data.ipynb.
 
 # %% auto 0
-__all__ = ['F1Score', 'accuracy', 'GLUEDataManager', 'TextGetter']
+__all__ = ['F1Score', 'accuracy', 'BucketedSortedDL', 'GLUEDataManager', 'RowGetter']
 
 # %% ../../nbs/01_data.ipynb 5
 import os
 import torch
 import numpy as np
-import pandas as pd
 import copy
+from types import MappingProxyType
 
 from fastai.text.all import *
-from datasets import load_dataset
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from sklearn.metrics import accuracy_score, f1_score
 
 from .transforms import TransTensorText, Undict, TokBatchTransform
+from .packing import pack_examples, PackedCategorize, PackedTokBatchTransform
 from torch.utils.data._utils.collate import default_collate
 
 # %% ../../nbs/01_data.ipynb 7
-class F1Score:
-    "Custom F1 Score metric for fastai"
+class F1Score(Metric):
+    "Streaming F1 Score metric for fastai, with per-class counts kept on the device until the epoch ends"
     def __init__(self, average='binary'):
+        if average not in ('binary', 'micro', 'macro', 'weighted'):
+            raise ValueError(f"average={average!r} not supported. Use one of: binary, micro, macro, weighted")
         self.average = average
 
-    def __call__(self, preds, targets):
-        preds = torch.argmax(preds, dim=1)
-        return f1_score(targets.cpu().numpy(), preds.cpu().numpy(), average=self.average)
+    def reset(self):
+        self.tp, self.n_pred, self.n_true = None, None, None
+
+    def accumulate(self, learn):
+        preds, targets = torch.argmax(learn.pred, dim=1).view(-1), learn.y.view(-1)
+        n_cls = learn.pred.shape[1]
+        # True positives, predicted and actual counts per class; FP and FN are derived from these
+        counts = [torch.bincount(preds[preds == targets], minlength=n_cls),
+                  torch.bincount(preds, minlength=n_cls),
+                  torch.bincount(targets, minlength=n_cls)]
+        if self.tp is None:
+            self.tp, self.n_pred, self.n_true = counts
+        else:
+            self.tp, self.n_pred, self.n_true = [a + b for a, b in zip((self.tp, self.n_pred, self.n_true), counts)]
+
+    @property
+    def value(self):
+        if self.tp is None: return None
+        # Single device->host copy per epoch
+        tp, n_pred, n_true = torch.stack([self.tp, self.n_pred, self.n_true]).cpu().double()
+        if self.average == 'micro':
+            tp, n_pred, n_true = tp.sum(), n_pred.sum(), n_true.sum()
+        # 2*tp / (2*tp + fp + fn), with 0 for classes that were never predicted nor present
+        denom = n_pred + n_true
+        f1 = torch.where(denom > 0, 2 * tp / denom.clamp(min=1), torch.zeros_like(denom))
+        if self.average == 'binary': return f1[1].item()
+        if self.average == 'weighted': return (f1 * n_true).sum().item() / max(n_true.sum().item(), 1)
+        # Like sklearn, macro only averages classes that appear in the predictions or targets
+        seen = denom > 0
+        return f1[seen].mean().item() if seen.any() else 0.
+
+    @property
+    def name(self): return 'f1_score'
 
     def __repr__(self):
         return f"F1Score(average={self.average})"
@@ -37,130 +67,263 @@ class F1Score:
 def accuracy(preds, targets):
     "Accuracy metric for fastai"
     preds = torch.argmax(preds, dim=1)
-    return (preds == targets).float().mean()
+    # Sum the bool matches directly instead of materialising a float copy of the batch
+    eq = preds.eq(targets)
+    return eq.sum().to(torch.float32) / eq.numel()
 
 # %% ../../nbs/01_data.ipynb 9
+class BucketedSortedDL(SortedDL):
+    "A `SortedDL` that batches each length bucket with its own batch size"
+    def __init__(self, dataset, buckets=None, bucket_bs=None, **kwargs):
+        super().__init__(dataset, **kwargs)
+        # Without buckets it behaves like `SortedDL`: a single bucket of every item, batched at `bs`
+        if buckets is None: buckets = [list(range(len(self.res)))]
+        if bucket_bs is None: bucket_bs = [self.bs] * len(buckets)
+        self.buckets, self.bucket_bs = buckets, bucket_bs
+        self.bucket_of = np.zeros(len(self.res), dtype=int)
+        for b, idxs in enumerate(buckets): self.bucket_of[idxs] = b
+
+    def __len__(self):
+        if self.drop_last: return sum(len(idxs) // bs for idxs, bs in zip(self.buckets, self.bucket_bs))
+        return sum((len(idxs) + bs - 1) // bs for idxs, bs in zip(self.buckets, self.bucket_bs))
+
+    def get_idxs(self):
+        full, partial = [], []
+        for idxs, bs in zip(self.buckets, self.bucket_bs):
+            if self.shuffle:
+                # Same trick as `SortedDL`: shuffle, then sort chunks by length so batches stay tight
+                idxs = self.rng.sample(idxs, len(idxs))
+                chunks = [idxs[i:i+bs*50] for i in range(0, len(idxs), bs*50)]
+                idxs = [i for c in chunks for i in sorted(c, key=lambda i: self.res[i], reverse=True)]
+            else:
+                idxs = sorted(idxs, key=lambda i: self.res[i], reverse=True)
+            full += [idxs[i:i+bs] for i in range(0, len(idxs) - bs + 1, bs)]
+            if len(idxs) % bs and not self.drop_last: partial.append(idxs[len(idxs) - len(idxs) % bs:])
+        if self.shuffle: full = self.rng.sample(full, len(full))
+        # Partial batches go last, one per bucket, so `_batchify` can recover the batches from the flat order
+        return [i for b in full + partial for i in b]
+
+    def _batchify(self, idxs):
+        "Cut flat `idxs` into batches at the bucket batch size or wherever the bucket changes"
+        b = []
+        for i in idxs:
+            if b and (len(b) == self.bucket_bs[self.bucket_of[b[0]]] or self.bucket_of[i] != self.bucket_of[b[0]]):
+                yield b
+                b = []
+            b.append(i)
+        if b: yield b
+
+    def sample(self):
+        # Workers are assigned whole batches since batch sizes differ between buckets
+        return (b for i, b in enumerate(self._batchify(self._DataLoader__idxs)) if i % self.num_workers == self.offs)
+
+    def create_batches(self, samps):
+        if self.dataset is not None: self.it = iter(self.dataset)
+        for b in samps:
+            yield self.do_batch([o for o in map(self.do_item, b) if o is not None])
+
+    @delegates(SortedDL.new)
+    def new(self, dataset=None, **kwargs):
+        # Buckets are indices into this dataset, so a new dataset without buckets (e.g. `test_dl`) gets a plain `SortedDL`
+        if dataset is not None and 'buckets' not in kwargs: return super().new(dataset=dataset, cls=SortedDL, **kwargs)
+        kwargs = merge({'buckets': self.buckets, 'bucket_bs': self.bucket_bs}, kwargs)
+        return super().new(dataset=dataset, **kwargs)
+
+# %% ../../nbs/01_data.ipynb 10
+# GLUE task constants, shared read-only by every GLUEDataManager
+_TEXT_FIELDS = MappingProxyType({
+    'sst2': ('sentence', None),
+    'mrpc': ('sentence1', 'sentence2'),
+    'rte': ('sentence1', 'sentence2')
+})
+
+_NUM_LABELS = MappingProxyType({
+    'sst2': 2,
+    'mrpc': 2,
+    'rte': 2
+})
+
+# Factories so every manager gets its own stateful metric instances (e.g. F1Score counters)
+_METRICS_FACTORIES = MappingProxyType({
+    'sst2': lambda: [accuracy],
+    'mrpc': lambda: [F1Score(), accuracy],
+    'rte': lambda: [accuracy]
+})
+
+# %% ../../nbs/01_data.ipynb 11
 class GLUEDataManager:
     """Manager for GLUE dataset loading and processing."""
 
-    def __init__(self, task_name, model_name, max_length=512, bs=32, val_bs=None, cache_dir=None):
+    def __init__(self, task_name, model_name, max_length=512, bs=32, val_bs=None, cache_dir=None, num_proc=None,
+                 num_workers=None, prefetch_factor=4, padding='longest'):
         self.task_name = task_name.lower()
         self.model_name = model_name
         self.max_length = max_length
         self.bs = bs
         self.val_bs = val_bs or 2*bs
         self.cache_dir = cache_dir
+        self.num_proc = num_proc
+        self.num_workers = min(8, os.cpu_count()) if num_workers is None else num_workers
+        self.prefetch_factor = prefetch_factor
+        # 'max_length' gives every batch (packed or not) the same sequence length, e.g. for `torch.compile`
+        self.padding = padding
 
-        if self.task_name not in ['sst2', 'mrpc', 'rte']:
-            raise ValueError(f"Task {self.task_name} not supported. Use one of: sst2, mrpc, rte")
-
-        self.text_fields = {
-            'sst2': ['sentence', None],
-            'mrpc': ['sentence1', 'sentence2'],
-            'rte': ['sentence1', 'sentence2']
-        }
+        if self.task_name not in _TEXT_FIELDS:
+            raise ValueError(f"Task {self.task_name} not supported. Use one of: {', '.join(_TEXT_FIELDS)}")
 
-        self.metrics = {
-            'sst2': [accuracy],
-            'mrpc': [F1Score(), accuracy],
-            'rte': [accuracy]
-        }
-
-        self.num_labels = {
-            'sst2': 2,
-            'mrpc': 2,
-            'rte': 2
-        }
+        # Plain dict copies: the read-only proxies themselves cannot be pickled or deep-copied
+        self.text_fields = dict(_TEXT_FIELDS)
+        self.metrics = {self.task_name: _METRICS_FACTORIES[self.task_name]()}
+        self.num_labels = dict(_NUM_LABELS)
 
+        from transformers import AutoTokenizer
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
 
     def load_datasets(self, custom_datasets=None, max_samples=None):
         print(f"Loading datasets for {self.task_name}...")
 
-        if custom_datasets is not None:
-            datasets = custom_datasets
-        else:
-            datasets = load_dataset('glue', self.task_name, cache_dir=self.cache_dir)
+        from datasets import load_dataset, load_from_disk
 
-        if max_samples is not None:
-            for split in datasets.keys():
-                if split != 'test':
-                    datasets[split] = datasets[split].select(range(min(max_samples, len(datasets[split]))))
+        cache_path = self._tokenized_cache_path()
+        if custom_datasets is None and cache_path is not None:
+            if os.path.isdir(cache_path):
+                datasets = load_from_disk(cache_path)
+            else:
+                datasets = self._tokenize_datasets(load_dataset('glue', self.task_name, cache_dir=self.cache_dir))
+                datasets.save_to_disk(cache_path)
+            # Subsample after tokenization so the cached full splits are reused for any max_samples
+            datasets = self._subsample(datasets, max_samples)
+        else:
+            # Nothing is cached, so only the kept rows are tokenized
+            datasets = custom_datasets
+            if datasets is None: datasets = load_dataset('glue', self.task_name, cache_dir=self.cache_dir)
+            datasets = self._tokenize_datasets(self._subsample(datasets, max_samples))
 
         print(f"Dataset sizes: {', '.join([f'{k}: {len(v)}' for k, v in datasets.items()])}")
         self.datasets = datasets
         return datasets
 
-    def _prepare_fastai_data(self, datasets):
-        text_field1, text_field2 = self.text_fields[self.task_name]
-
-        train_texts, train_labels = [], []
-        for item in datasets['train']:
-            if text_field2 is not None:
-                train_texts.append((item[text_field1], item[text_field2]))
-            else:
-                train_texts.append(item[text_field1])
-            train_labels.append(item['label'])
-
-        val_texts, val_labels = [], []
-        for item in datasets['validation']:
-            if text_field2 is not None:
-                val_texts.append((item[text_field1], item[text_field2]))
-            else:
-                val_texts.append(item[text_field1])
-            val_labels.append(item['label'])
+    def _subsample(self, datasets, max_samples):
+        "First `max_samples` rows of every split but `test`"
+        if max_samples is None: return datasets
+        return type(datasets)({split: ds if split == 'test' else ds.select(range(min(max_samples, len(ds))))
+                               for split, ds in datasets.items()})
 
-        return train_texts, train_labels, val_texts, val_labels
+    def _tokenized_cache_path(self):
+        "Directory under `cache_dir` holding the tokenized splits for this task, model and `max_length`"
+        if self.cache_dir is None: return None
+        return os.path.join(self.cache_dir, f"{self.task_name}_{self.model_name.replace('/', '_')}_{self.max_length}")
 
-    def create_dataloaders(self, custom_datasets=None, max_samples=None):
+    def _tokenize(self, examples):
+        "Batched tokenization function for `Dataset.map`"
+        text_field1, text_field2 = self.text_fields[self.task_name]
+        return self.tokenizer(examples[text_field1],
+                              examples[text_field2] if text_field2 is not None else None,
+                              truncation=True,
+                              max_length=self.max_length,
+                              return_length=True)
+
+    def _input_columns(self, ds):
+        "Columns of a tokenized (or packed) split that are fed to the model"
+        return [c for c in ds.column_names if c not in ('label', 'length')]
+
+    def _rows(self, ds):
+        "Model input rows of `ds` as dicts, built from whole-column reads rather than row-by-row Arrow access"
+        cols = self._input_columns(ds)
+        return [dict(zip(cols, vals)) for vals in zip(*(ds[c] for c in cols))]
+
+    def _tokenize_split(self, ds):
+        "Tokenize a single split, replacing the text columns with token id columns"
+        return ds.map(self._tokenize, batched=True, batch_size=1000, num_proc=self.num_proc,
+                      remove_columns=[c for c in ds.column_names if c != 'label'])
+
+    def _tokenize_datasets(self, datasets):
+        "Tokenize every split once so token ids live in Arrow columns instead of being recomputed per batch"
+        from datasets import DatasetDict
+
+        # New DatasetDict so the caller's splits keep their text columns; already tokenized splits are reused
+        return DatasetDict({split: ds if 'input_ids' in ds.column_names else self._tokenize_split(ds)
+                            for split, ds in datasets.items()})
+
+    def _bucket_indices(self, lens, boundaries=(64, 128, 256, 512)):
+        "Group sample indices by length, bucket `b` holding lengths up to `boundaries[b]`"
+        bucket_ids = np.minimum(np.searchsorted(boundaries, lens), len(boundaries) - 1)
+        return [np.flatnonzero(bucket_ids == b).tolist() for b in range(len(boundaries))]
+
+    def _bucket_kwargs(self, lens, token_budget, boundaries=(64, 128, 256, 512)):
+        "Buckets and per-bucket batch sizes so every batch holds roughly `token_budget` tokens"
+        boundaries = [b for b in boundaries if b < self.max_length] + [self.max_length]
+        return {'buckets': self._bucket_indices(lens, boundaries),
+                'bucket_bs': [max(1, token_budget // b) for b in boundaries]}
+
+    def _set_prefetch(self, *dls):
+        """fastai's `DataLoader` has no `prefetch_factor` argument, so set it on the underlying loader.
+        It does not carry over to loaders made with `dl.new(...)` (e.g. inside `Learner.get_preds`),
+        which fall back to PyTorch's default of 2 batches per worker"""
+        for dl in dls: dl.fake_l.prefetch_factor = self.prefetch_factor
+
+    def create_dataloaders(self, custom_datasets=None, max_samples=None, token_budget=None, pack=False):
         if not hasattr(self, 'datasets') or custom_datasets is not None:
             self.load_datasets(custom_datasets, max_samples)
 
-        train_texts, train_labels, val_texts, val_labels = self._prepare_fastai_data(self.datasets)
+        train_ds, val_ds = self.datasets['train'], self.datasets['validation']
+        # Packed train rows hold a list of labels, so their vocab comes from the unpacked labels
+        y_tfm = PackedCategorize(vocab=train_ds['label']) if pack else Categorize()
+        if pack:
+            # Several training examples per row of up to max_length tokens; `label` becomes a list per row.
+            # Validation stays unpacked so predictions keep one row per example.
+            train_ds = pack_examples(train_ds, self.max_length)
+        n_train, n_val = len(train_ds), len(val_ds)
 
-        # Combine train and validation data for DataBlock
-        all_texts = train_texts + val_texts
-        all_labels = train_labels + val_labels
-        df = pd.DataFrame({'text': all_texts, 'label': all_labels})
+        # Items are row indices into the tokenized train + validation rows
+        train_x, val_x = self._rows(train_ds), self._rows(val_ds)
 
-        # Calculate sequence lengths for sorting (optional, but helpful for efficiency)
-        train_lens = [len(str(t)) for t in train_texts]
-        val_lens = [len(str(t)) for t in val_texts]
+        # Token counts (after truncation) from the `length` column, used by SortedDL for bucketing
+        train_lens = train_ds['length']
+        val_lens = val_ds['length']
 
-        # Use the reference code pattern for the DataBlock setup
+        # Texts are already tokenized (and truncated to max_length), so the batch transform only pads,
+        # by default each batch to its own longest sequence; SortedDL keeps similar lengths together
         dls_kwargs = {
-            'before_batch': TokBatchTransform(
-                pretrained_model_name=self.model_name,
+            'before_batch': (PackedTokBatchTransform if pack else TokBatchTransform)(
+                tokenizer=self.tokenizer,
                 max_length=self.max_length,
-                padding='max_length',
+                padding=self.padding,
                 truncation=True
             ),
             'create_batch': fa_convert  # Use fastai's standard batch creation
         }
 
-        # Define the text block with the same structure as reference
-        text_block = TransformBlock(
-            dl_type=SortedDL,  # Use SortedDL to enable length-based sorting
-            dls_kwargs=dls_kwargs,
-            batch_tfms=Undict()  # Add Undict for decoding
-        )
-
-        # Create DataBlock
-        glue_block = DataBlock(
-            blocks=[text_block, CategoryBlock()],
-            get_x=ColReader('text'),
-            get_y=ColReader('label'),
-            splitter=IndexSplitter(range(len(train_texts), len(train_texts) + len(val_labels)))
+        # Items are indices into the train + validation rows; the getters map them straight to
+        # tokenized rows and labels, so no DataBlock/DataFrame layer is needed in between
+        dsets = Datasets(
+            range(n_train + n_val),
+            tfms=[[RowGetter(train_x, val_x)], [RowGetter(train_ds['label'], val_ds['label']), y_tfm]],
+            splits=[range(n_train), range(n_train, n_train + n_val)]
         )
 
         # Create DataLoaders with length-based resources for efficiency
         dl_kwargs = [{'res': train_lens}, {'val_res': val_lens}]
-        dls = glue_block.dataloaders(
-            df,
+        if token_budget is not None:
+            # e.g. token_budget=bs*max_length: short buckets get bigger batches, long ones smaller
+            dl_kwargs[0].update(self._bucket_kwargs(train_lens, token_budget))
+            dl_kwargs[1].update(self._bucket_kwargs(val_lens, token_budget * self.val_bs // self.bs))
+        # The tokenizer already ran in this process; keep its thread pool out of the forked workers
+        if self.num_workers: os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+        dls = dsets.dataloaders(
             bs=self.bs,
             val_bs=self.val_bs,
-            dl_kwargs=dl_kwargs
+            dl_type=SortedDL if token_budget is None else BucketedSortedDL,  # Length-based sorting (and bucketing)
+            after_batch=Undict(),  # Add Undict for decoding
+            num_workers=self.num_workers,
+            pin_memory=torch.cuda.is_available(),  # Page-locked batches for faster host-to-device copies
+            dl_kwargs=dl_kwargs,
+            **dls_kwargs
         )
+        # Validation batches are unpacked, so they need their own batch types for decoding rather than the
+        # packed ones `dl.new` copies from the train loader
+        if pack: dls.valid._one_pass()
+        self._set_prefetch(*dls.loaders)
 
         self.dls = dls
         return dls
@@ -173,22 +336,18 @@ class GLUEDataManager:
         if test_data is None:
             raise ValueError("No test data available.")
 
-        text_field1, text_field2 = self.text_fields[self.task_name]
-        test_texts = []
-        for item in test_data:
-            if text_field2 is not None:
-                test_texts.append((item[text_field1], item[text_field2]))
-            else:
-                test_texts.append(item[text_field1])
+        if 'input_ids' not in test_data.column_names:
+            test_data = self._tokenize_split(test_data)
 
-        test_df = pd.DataFrame({'text': test_texts, 'label': [0] * len(test_texts)})
-        test_dl = self.dls.test_dl(test_df)
+        # Test items are already tokenized rows, so skip the index getter of the training pipeline
+        test_dl = self.dls.test_dl(self._rows(test_data), rm_type_tfms=1, val_res=test_data['length'])
+        self._set_prefetch(test_dl)
         return test_dl
 
-class TextGetter(ItemTransform):
-    """ItemTransform for getting text fields from a sample"""
-    def __init__(self, s1='text', s2=None):
-        self.s1, self.s2 = s1, s2
-    def encodes(self, sample):
-        if self.s2 is None: return sample[self.s1]
-        else: return sample[self.s1], sample[self.s2]
+class RowGetter(ItemTransform):
+    """ItemTransform for getting row `i` from indexables laid end to end, e.g. tokenized HF `Dataset` splits"""
+    def __init__(self, *items):
+        self.items, self.offsets = items, np.cumsum([0] + [len(o) for o in items])
+    def encodes(self, i):
+        j = np.searchsorted(self.offsets, i, side='right') - 1
+        return self.items[j][int(i - self.offsets[j])]
@@ -0,0 +1,125 @@
+"""Sequence packing utilities for BERT rank experiments"""
+
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/01b_data_packing.ipynb.
+
+# %% auto 0
+__all__ = ['pack_ffd', 'pack_examples', 'PackedCategorize', 'PackedTokBatchTransform']
+
+# %% ../../nbs/01b_data_packing.ipynb 3
+import torch
+import numpy as np
+from fastai.text.all import *
+
+from .transforms import TokBatchTransform
+
+try:
+    from rank_bert.data._packing_numba import pack_ffd as _pack_ffd_numba
+except ImportError:
+    _pack_ffd_numba = None
+
+# %% ../../nbs/01b_data_packing.ipynb 5
+def pack_ffd(lengths, max_len):
+    "First-fit-decreasing bin packing, returns the bin index of every sample so no bin holds more than `max_len` tokens"
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if _pack_ffd_numba is not None:
+        return _pack_ffd_numba(lengths, max_len)
+    bin_ids = np.empty(len(lengths), dtype=np.int64)
+    space = []
+    for i in np.argsort(-lengths, kind='stable'):
+        for b, free in enumerate(space):
+            if free >= lengths[i]: break
+        else:
+            b = len(space)
+            space.append(max_len)
+        space[b] -= lengths[i]
+        bin_ids[i] = b
+    return bin_ids
+
+# %% ../../nbs/01b_data_packing.ipynb 6
+def pack_examples(tokenized, max_length):
+    """
+    Pack a tokenized split into rows of at most `max_length` tokens.
+
+    Args:
+        tokenized (Dataset): Tokenized split with `input_ids`, `length` and `label` columns
+        max_length (int): Maximum number of tokens per packed row
+
+    Returns:
+        Dataset: One row per pack, with the concatenated token columns, `position_ids`,
+        `example_boundaries` (start offset of every example), `label` (one label per example) and `length`
+    """
+    from datasets import Dataset
+
+    lengths = tokenized['length']
+    bin_ids = pack_ffd(lengths, max_length)
+    n_bins = int(bin_ids.max()) + 1 if len(bin_ids) else 0
+
+    cols = [c for c in ('input_ids', 'token_type_ids') if c in tokenized.column_names]
+    data = {c: tokenized[c] for c in cols}
+    labels = tokenized['label']
+
+    packed = {c: [[] for _ in range(n_bins)] for c in cols + ['position_ids', 'example_boundaries', 'label']}
+    for i, b in enumerate(bin_ids):
+        packed['example_boundaries'][b].append(len(packed['input_ids'][b]))
+        for c in cols: packed[c][b].extend(data[c][i])
+        packed['position_ids'][b].extend(range(lengths[i]))
+        packed['label'][b].append(labels[i])
+    packed['length'] = [len(ids) for ids in packed['input_ids']]
+    return Dataset.from_dict(packed)
+
+# %% ../../nbs/01b_data_packing.ipynb 7
+class PackedCategorize(Categorize):
+    "`Categorize` that also encodes the list of labels of a packed row; needs the `vocab` of the unpacked labels"
+    def encodes(self, o):
+        if is_listy(o): return [self.vocab.o2i[o_] for o_ in o]
+        return super().encodes(o)
+
+class PackedTokBatchTransform(TokBatchTransform):
+    """
+    `TokBatchTransform` that also collates packed rows from `pack_examples`.
+    Builds a `(bs, L, L)` block-diagonal attention mask and the `[CLS]` position of every example;
+    labels of all examples in the batch are flattened into one tensor.
+    Rows are padded to the longest row of the batch, or to `max_length` with `padding='max_length'`.
+    Rows that are not packed are handled by `TokBatchTransform`.
+    """
+    def encodes(self, batch):
+        if batch is None or len(batch) == 0 or not (isinstance(batch[0][0], dict) and 'example_boundaries' in batch[0][0]):
+            return super().encodes(batch)
+
+        rows = [s[0] for s in batch]
+        bs = len(rows)
+        seq_len = self.max_length if self.padding == 'max_length' else max(len(r['input_ids']) for r in rows)
+        input_ids = torch.full((bs, seq_len), self.tokenizer.pad_token_id, dtype=torch.int32)
+        token_type_ids = torch.zeros(bs, seq_len, dtype=torch.int32)
+        position_ids = torch.zeros(bs, seq_len, dtype=torch.int32)
+        # Index of the example each token belongs to, -1 for padding
+        segment_ids = torch.full((bs, seq_len), -1, dtype=torch.long)
+        cls_index = []
+
+        for r, row in enumerate(rows):
+            n = len(row['input_ids'])
+            input_ids[r, :n] = torch.tensor(row['input_ids'])
+            position_ids[r, :n] = torch.tensor(row['position_ids'])
+            if 'token_type_ids' in row:
+                token_type_ids[r, :n] = torch.tensor(row['token_type_ids'])
+            starts = row['example_boundaries']
+            for k, (start, end) in enumerate(zip(starts, starts[1:] + [n])):
+                segment_ids[r, start:end] = k
+            cls_index += [(r, start) for start in starts]
+
+        # Tokens only attend to tokens of the same example
+        attention_mask = (segment_ids[:, :, None] == segment_ids[:, None, :]) & (segment_ids[:, :, None] >= 0)
+
+        inputs = {'input_ids': input_ids,
+                  'attention_mask': attention_mask,
+                  'position_ids': position_ids,
+                  'cls_index': torch.tensor(cls_index)}
+        if 'token_type_ids' in rows[0]:
+            inputs['token_type_ids'] = token_type_ids
+
+        # Label ids from `PackedCategorize`, typed so `Categorize.decodes` can map them back
+        labels = TensorCategory(torch.tensor([l for s in batch for l in s[1]]))
+        if self.with_labels:
+            inputs['labels'] = labels
+            return (inputs, )
+        return (inputs, labels)
@@ -1,34 +1,59 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/01a_data_transforms.ipynb.
 
 # %% auto 0
-__all__ = ['TransTensorText', 'Undict', 'TokBatchTransform']
+__all__ = ['TransTensorText', 'Undict', 'split_by_sep', 'TokBatchTransform']
 
 # %% ../../nbs/01a_data_transforms.ipynb 4
 import torch
 from fastai.text.all import *
-from transformers import AutoTokenizer
 from torch.utils.data._utils.collate import default_collate
 
 # %% ../../nbs/01a_data_transforms.ipynb 6
 class TransTensorText(TensorBase): pass
 
-class Undict(Transform):
-    """Transform to convert tokenizer output dict to TransTensorText for decoding"""
-    def decodes(self, x:dict):
-        if 'input_ids' in x:
-            res = TransTensorText(x['input_ids'])
-            return res
-        return x
+class Undict(ItemTransform):
+    """Transform to convert the model inputs of a batch (tokenizer output dict or positional tuple) to TransTensorText for decoding"""
+    def decodes(self, b):
+        x = b[0]
+        if isinstance(x, dict) and 'cls_index' in x: return self._decode_packed(x, b[1])
+        if isinstance(x, dict) and 'input_ids' in x: x = TransTensorText(x['input_ids'])
+        # Positional inputs are a plain tuple starting with `input_ids`
+        elif isinstance(x, tuple): x = TransTensorText(x[0])
+        return (x, *b[1:])
+
+    def _decode_packed(self, x, y):
+        "Show the first example of every packed row with its label, so texts and labels line up per row"
+        rows = x['cls_index'][:, 0]
+        first = torch.ones_like(rows, dtype=torch.bool)
+        first[1:] = rows[1:] != rows[:-1]
+        # Tokens after the first example (later examples and padding) are overwritten with the row's
+        # leading [CLS], a special token that decoding skips
+        ids = x['input_ids']
+        later = (x['position_ids'] == 0).cumsum(1) > 1
+        ids = torch.where(later, ids[:, :1], ids)
+        return (TransTensorText(ids), y[first])
+
+def split_by_sep(x, sep_token_id):
+    "Split token ids `x` of a text pair at the first `sep_token_id` into the ids of each text"
+    sep = (x == sep_token_id).nonzero()
+    if len(sep) == 0: return x, x[:0]
+    i = int(sep[0])
+    return x[:i], x[i+1:]
 
 class TokBatchTransform(Transform):
     """
     Tokenizes texts in batches using pretrained HuggingFace tokenizer.
+    Items that are already tokenized (dicts of token ids) are only padded and stacked.
+    Model inputs are returned as a plain `(input_ids, attention_mask, token_type_ids)` tuple,
+    with `token_type_ids` None when the tokenizer has none.
     Following the reference implementation pattern.
     """
-    def __init__(self, pretrained_model_name=None, tokenizer_cls=AutoTokenizer,
+    def __init__(self, pretrained_model_name=None, tokenizer_cls=None,
                  config=None, tokenizer=None, with_labels=False,
                  padding=True, truncation=True, max_length=None, **kwargs):
         if tokenizer is None:
+            if tokenizer_cls is None:
+                from transformers import AutoTokenizer as tokenizer_cls
             tokenizer = tokenizer_cls.from_pretrained(pretrained_model_name, config=config)
         self.tokenizer = tokenizer
         self.kwargs = kwargs
@@ -39,23 +64,49 @@ class TokBatchTransform(Transform):
         # Handle initialization case - if batch is None or empty
         if batch is None or len(batch) == 0:
             # Return a dummy structure for initialization
-            dummy = {'input_ids': torch.zeros(1, 10, dtype=torch.long),
-                    'attention_mask': torch.zeros(1, 10, dtype=torch.long)}
-
+            token_type_ids = None
             if 'token_type_ids' in self.tokenizer.model_input_names:
-                dummy['token_type_ids'] = torch.zeros(1, 10, dtype=torch.long)
+                token_type_ids = torch.zeros(1, 10, dtype=torch.int32)
+            dummy = (torch.zeros(1, 10, dtype=torch.int32), torch.zeros(1, 10, dtype=torch.bool), token_type_ids)
 
             return (dummy, torch.zeros(1, dtype=torch.long))
 
-        # Check if first item is a tuple (text pair)
+        if isinstance(batch[0][0], dict):
+            # Already tokenized (e.g. with `Dataset.map`), only pad and stack
+            enc = self.tokenizer.pad([s[0] for s in batch],
+                                     padding=self.padding,
+                                     max_length=self.max_length,
+                                     return_tensors='pt')
+            # Text pairs show up as non-zero segment ids, so `decodes` can split them on [SEP]
+            if not self._two_texts and 'token_type_ids' in enc:
+                self._two_texts = bool(enc['token_type_ids'].any())
+        else:
+            enc = self._tokenize_texts(batch)
+        # int32 ids and a bool mask instead of the tokenizer's int64 cut host-to-device traffic;
+        # BERT embeddings take int32 indices and the mask is cast to the additive float mask inside the model
+        token_type_ids = enc['token_type_ids'].to(torch.int32) if 'token_type_ids' in enc else None
+        inputs = (enc['input_ids'].to(torch.int32), enc['attention_mask'].bool(), token_type_ids)
+
+        # Collate labels
+        labels = default_collate([s[1:] for s in batch])
+
+        # Return structure depends on with_labels flag
+        if self.with_labels:
+            return (inputs + (labels[0], ), )
+        else:
+            return (inputs, ) + tuple(labels)
+
+    def _tokenize_texts(self, batch):
+        "Tokenize raw texts (or text pairs) of `batch` with a single tokenizer call"
+        # Split texts into parallel lists in one pass so the tokenizer sees the whole batch at once
         if is_listy(batch[0][0]):
             self._two_texts = True
-            texts = ([s[0][0] for s in batch], [s[0][1] for s in batch])
+            s1s, s2s = map(list, zip(*(s[0] for s in batch)))
         else:
-            texts = ([s[0] for s in batch],)
+            s1s, s2s = [s[0] for s in batch], None
 
-        # Tokenize texts
-        inputs = self.tokenizer(*texts,
+        # Single batched call - fast tokenizers run the whole batch in Rust
+        return self.tokenizer(s1s, s2s,
                               add_special_tokens=True,
                               padding=self.padding,
                               truncation=self.truncation,
@@ -63,21 +114,11 @@ class TokBatchTransform(Transform):
                               return_tensors='pt',
                               **self.kwargs)
 
-        # Collate labels
-        labels = default_collate([s[1:] for s in batch])
-
-        # Return structure depends on with_labels flag
-        if self.with_labels:
-            inputs['labels'] = labels[0]
-            return (inputs, )
-        else:
-            return (inputs, ) + tuple(labels)
-
     def decodes(self, x):
         if isinstance(x, TransTensorText):
             if self._two_texts:
                 x1, x2 = split_by_sep(x, self.tokenizer.sep_token_id)
-                return (TitledStr(self.tokenizer.decode(x1.cpu(), skip_special_tokens=True)),
-                        TitledStr(self.tokenizer.decode(x2.cpu(), skip_special_tokens=True)))
+                return TitledTuple((TitledStr(self.tokenizer.decode(x1.cpu(), skip_special_tokens=True)),
+                                    TitledStr(self.tokenizer.decode(x2.cpu(), skip_special_tokens=True))))
             return TitledStr(self.tokenizer.decode(x.cpu(), skip_special_tokens=True))
         return x
@@ -3,9 +3,11 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/02_models.ipynb.
 
 # %% auto 0
-__all__ = ['GLUE_NUM_LABELS', 'BERT_CONFIGS', 'get_pretrained_model', 'count_parameters', 'BertWrapper', 'get_wrapped_model']
+__all__ = ['GLUE_NUM_LABELS', 'GLUE_SINGLE_SENTENCE_TASKS', 'BERT_CONFIGS', 'get_pretrained_model', 'count_parameters',
+           'BertWrapper', 'get_wrapped_model']
 
 # %% ../../nbs/02_models.ipynb 5
+import inspect
 import torch
 import torch.nn as nn
 import numpy as np
@@ -20,6 +22,9 @@ GLUE_NUM_LABELS = {
     'rte': 2
 }
 
+# Tasks whose inputs are single sentences, so segment (token type) ids are all zeros
+GLUE_SINGLE_SENTENCE_TASKS = ('sst2', 'cola')
+
 # %% ../../nbs/02_models.ipynb 8
 # Model configuration constants
 BERT_CONFIGS = {
@@ -59,6 +64,9 @@ def get_pretrained_model(model_name, task_name, num_labels=None):
     # Get the number of labels for the task
     num_labels = num_labels or GLUE_NUM_LABELS.get(task_name, 2)
 
+    # Attention runs through the fused `scaled_dot_product_attention` kernel. FlashAttention-2 is not
+    # supported by BERT in `transformers` and would not take the block-diagonal masks of packed rows
+
     # Check if the model name is a known configuration or a HuggingFace model
     if model_name in BERT_CONFIGS:
         # Create a new model with the specified configuration
@@ -66,14 +74,16 @@ def get_pretrained_model(model_name, task_name, num_labels=None):
             **BERT_CONFIGS[model_name],
             num_labels=num_labels,
             hidden_dropout_prob=0.1,
-            attention_probs_dropout_prob=0.1
+            attention_probs_dropout_prob=0.1,
+            attn_implementation='sdpa'
         )
         model = BertForSequenceClassification(config)
     else:
         # Load a pretrained model from HuggingFace
         model = AutoModelForSequenceClassification.from_pretrained(
             model_name,
-            num_labels=num_labels
+            num_labels=num_labels,
+            attn_implementation='sdpa'
         )
 
     return model
@@ -101,51 +111,108 @@ class BertWrapper(Module):
     making it easier to modify and monitor model behavior.
     """
 
-    def __init__(self, model):
+    def __init__(self, model, amp_dtype=None, uses_token_type_ids=None):
         """
         Initialize the BERT wrapper.
 
         Args:
             model: Pretrained BERT model
+            amp_dtype: Autocast dtype (`torch.bfloat16` or `torch.float16`) for the forward pass
+                       on CUDA inputs, or None to run in full precision
+            uses_token_type_ids: Whether to pass `token_type_ids` to the model. None detects it from
+                                 the model's `forward` signature; single-sentence tasks can pass False
+                                 since their token type ids are all zeros, BERT's default
         """
         self.model = model
+        if uses_token_type_ids is None:
+            uses_token_type_ids = 'token_type_ids' in inspect.signature(model.forward).parameters
+        # Pick the call once instead of branching on every batch
+        self._fwd = self._fwd_with_ttids if uses_token_type_ids else self._fwd_no_ttids
+        self.amp_dtype = amp_dtype
 
     def forward(self, x):
         """
         Forward pass through the model.
 
         Args:
-            x: Dictionary of inputs from tokenizer
+            x: `(input_ids, attention_mask, token_type_ids)` tuple from `TokBatchTransform`,
+               dict of packed inputs from `PackedTokBatchTransform`, or a plain tokenizer output dict
+
+        Returns:
+            FP32 logits
+        """
+        # No device copies here: fastai's DataLoader already moves (pinned) batches to the model's device
+        packed = isinstance(x, dict) and 'cls_index' in x
+        if isinstance(x, dict) and not packed:
+            x = (x['input_ids'], x['attention_mask'], x.get('token_type_ids', None))
+
+        # Matmuls run in `amp_dtype` on GPU; logits go back to FP32 for the loss and metrics
+        input_ids = x['input_ids'] if packed else x[0]
+        use_amp = self.amp_dtype is not None and input_ids.is_cuda
+        with torch.autocast('cuda', dtype=self.amp_dtype or torch.bfloat16, enabled=use_amp):
+            # Packed rows hold several examples and need per-example pooling
+            if packed:
+                logits = self.forward_packed(x)
+            else:
+                logits = self.forward_unpacked(x)
+        return logits.float()
+
+    def forward_unpacked(self, x):
+        """
+        Forward pass for regular padded batches, one example per row.
+
+        Args:
+            x: `(input_ids, attention_mask, token_type_ids)` tuple of model inputs
+
+        Returns:
+            Model logits
+        """
+        return self._fwd(x[0], x[1], x[2]).logits
+
+    def _fwd_with_ttids(self, input_ids, attention_mask, token_type_ids):
+        return self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids
+        )
+
+    def _fwd_no_ttids(self, input_ids, attention_mask, token_type_ids=None):
+        return self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask
+        )
+
+    def forward_packed(self, x):
+        """
+        Forward pass for rows packed with `pack_examples`.
+
+        Args:
+            x: Dictionary of inputs from `PackedTokBatchTransform`, with a `(bs, L, L)` block-diagonal
+               `attention_mask` (broadcast over heads by BERT), per-example `position_ids`
+               and the `(row, position)` of every example's `[CLS]` token in `cls_index`
 
         Returns:
-            Model outputs
+            Logits for every packed example, in `cls_index` order
         """
-        # Handle either dict or tuple input
-        if isinstance(x, tuple):
-            x = x[0]
-
-        # Extract and ensure inputs are on the correct device
-        input_ids = x['input_ids']
-        attention_mask = x['attention_mask']
-        token_type_ids = x.get('token_type_ids', None)
-
-        # Forward pass through BERT
-        if token_type_ids is not None:
-            outputs = self.model(
-                input_ids=input_ids,
-                attention_mask=attention_mask,
-                token_type_ids=token_type_ids
-            )
-        else:
-            outputs = self.model(
-                input_ids=input_ids,
-                attention_mask=attention_mask
-            )
-
-        return outputs.logits
+        base = self.model.base_model
+        pooler = getattr(base, 'pooler', None)
+        if pooler is None or not all(hasattr(self.model, m) for m in ('dropout', 'classifier')):
+            raise ValueError(f"Packed batches need a BERT-style pooler, dropout and classifier head; "
+                             f"{type(self.model).__name__} does not have one, use `pack=False` for this model")
+        outputs = base(
+            input_ids=x['input_ids'],
+            attention_mask=x['attention_mask'],
+            token_type_ids=x.get('token_type_ids', None),
+            position_ids=x['position_ids']
+        )
+
+        # Pool each example's [CLS] token the same way BertForSequenceClassification pools position 0
+        cls_hidden = outputs.last_hidden_state[x['cls_index'][:, 0], x['cls_index'][:, 1]]
+        pooled = pooler.activation(pooler.dense(cls_hidden))
+        return self.model.classifier(self.model.dropout(pooled))
 
 # %% ../../nbs/02_models.ipynb 12
-def get_wrapped_model(model_name, task_name, num_labels=None):
+def get_wrapped_model(model_name, task_name, num_labels=None, amp_dtype='auto', compile=False):
     """
     Get a wrapped BERT model for fastai integration.
 
@@ -153,9 +220,25 @@ def get_wrapped_model(model_name, task_name, num_labels=None):
         model_name (str): HuggingFace model name or path
         task_name (str): GLUE task name
         num_labels (int, optional): Number of output labels
+        amp_dtype (torch.dtype, optional): Autocast dtype for the forward pass. 'auto' picks bfloat16
+            when CUDA supports it and full precision otherwise; pass `torch.float16` together with
+            fastai's `Learner.to_fp16()` so the loss is scaled
+        compile (bool): Compile the BERT encoder with `torch.compile` (CUDA only). The encoder runs for both
+            padded and packed batches; each new batch shape triggers a recompile, so pair it with
+            `GLUEDataManager(padding='max_length')`, which pads packed rows to `max_length` as well
 
     Returns:
         BertWrapper: Wrapped model
     """
+    if amp_dtype == 'auto':
+        amp_dtype = torch.bfloat16 if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else None
     model = get_pretrained_model(model_name, task_name, num_labels)
-    return BertWrapper(model)
+    # Known single-sentence tasks have all-zero token type ids, so they are not passed to the model;
+    # any other task (pairs like qqp or stsb, custom tasks) detects them from the model signature
+    uses_token_type_ids = False if task_name in GLUE_SINGLE_SENTENCE_TASKS else None
+    wrapped = BertWrapper(model, amp_dtype=amp_dtype, uses_token_type_ids=uses_token_type_ids)
+    if compile and torch.cuda.is_available():
+        # In-place `Module.compile` keeps the parameter names, so checkpoints and rank hooks are unaffected.
+        # The encoder (not the whole classifier) is compiled since `forward_packed` calls it directly
+        wrapped.model.base_model.compile(mode='reduce-overhead', fullgraph=True, dynamic=False)
+    return wrapped